@@ -13,40 +13,69 @@ import os
 import subprocess
 import sys
 import re
+import shlex
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import shutil
 import logging
 import argparse
+import collections
+import concurrent.futures
+import fractions
+import functools
+import hashlib
+import io
 import itertools
+import json
+import mmap
+import tempfile
+import threading
 
 # Set up logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
-def install_dependencies():
-    req_file = os.path.join(os.path.dirname(__file__), "requirements.txt")
+# Location of the script and of its bundled fonts folder
+SCRIPT_DIR = os.path.dirname(os.path.realpath(__file__))
+DEFAULT_FONTS_DIR = os.path.join(SCRIPT_DIR, "fonts")
+
+# Per-user cache for data that is reused between runs
+CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "playphraseme")
+
+def install_dependencies(force=False):
+    req_file = os.path.join(SCRIPT_DIR, "requirements.txt")
     if os.path.exists(req_file):
+        # pip only runs again when requirements.txt changes.
+        with open(req_file, "rb") as f:
+            req_hash = hashlib.sha256(f.read()).hexdigest()[:16]
+        sentinel = os.path.join(CACHE_DIR, f".deps_installed_{req_hash}")
+        if os.path.exists(sentinel) and not force:
+            return
         print("Installing dependencies from requirements.txt...")
         try:
-            subprocess.check_call([sys.executable, "-m", "pip", "install", "-r", req_file])
+            subprocess.check_call([sys.executable, "-m", "pip", "install", "--disable-pip-version-check", "--quiet",
+                                   "-r", req_file])
         except subprocess.CalledProcessError as e:
             print("Error installing dependencies:", e)
             sys.exit(1)
-
-# Automatic installation of dependencies
-install_dependencies()
+        try:
+            os.makedirs(CACHE_DIR, exist_ok=True)
+            open(sentinel, "w").close()
+        except OSError as e:
+            logging.warning(f"Could not record installed dependencies: {e}")
 
 def check_ffmpeg_installed():
-    try:
-        subprocess.run(["ffmpeg", "-version"],
-                       stdout=subprocess.DEVNULL,
-                       stderr=subprocess.DEVNULL,
-                       check=True)
-        logging.info("ffmpeg is installed and available.")
-    except Exception:
+    # A PATH lookup is enough here; running "ffmpeg -version" would cost a process start.
+    # The resolved paths are kept so later launches skip the PATH search (and can use posix_spawn).
+    global FFMPEG, FFPROBE
+    ffmpeg_path = shutil.which("ffmpeg")
+    if ffmpeg_path is None:
         logging.error("ffmpeg is not installed or not found in the system PATH. Please install ffmpeg before running this script.")
         sys.exit(1)
-
-check_ffmpeg_installed()
+    FFMPEG = os.path.abspath(ffmpeg_path)
+    ffprobe_path = shutil.which("ffprobe")
+    FFPROBE = os.path.abspath(ffprobe_path) if ffprobe_path else "ffprobe"
+    logging.info(f"ffmpeg is installed and available: {FFMPEG}")
 
 # ==================== Configuration (adjust as needed) ====================
 # Default fonts and sizes for overlays (default values)
@@ -73,39 +102,143 @@ WEBSITE_ALIGNMENT = 8                   # top center
 WEBSITE_MARGIN_V = 10
 
 GOOGLE_API_KEY = ""
+TRANSLATE_URL = "https://translation.googleapis.com/language/translate/v2"
+TRANSLATE_BATCH_SIZE = 128              # Max number of "q" entries per translate request
+
+TRANSLATE_TIMEOUT = (5, 30)             # (connect, read) seconds
+TRANSLATION_CACHE = {}                  # (text, target language) -> translation
+
+# Shared HTTP session so translate requests reuse keep-alive connections.
+# Rate limits and server errors are retried with backoff (POST included).
+TRANSLATE_SESSION = requests.Session()
+TRANSLATE_SESSION.mount("https://", HTTPAdapter(
+    pool_maxsize=16,
+    max_retries=Retry(total=3, backoff_factor=0.5, status_forcelist=[429, 500, 502, 503, 504],
+                      allowed_methods=["POST"], raise_on_status=False)))
 
 # Global variable to hold a custom fonts directory (if a custom font is used)
 CUSTOM_FONTS_DIR = None
+FONT_CACHE_FILE = os.path.join(CACHE_DIR, "fonts.json")
+CUE_CACHE_DIR = os.path.join(CACHE_DIR, "cues")
+TRANSLATION_CACHE_DIR = os.path.join(CACHE_DIR, "translations")
+
+# Per-video ffmpeg jobs run side by side; each one is capped at FFMPEG_THREADS
+FFMPEG_THREADS = 2
+PARALLEL_JOBS = max(1, (os.cpu_count() or 1) // FFMPEG_THREADS)
+# Cap on ffmpeg/ffprobe processes running at once across all pools (languages x clips)
+FFMPEG_SLOTS = threading.BoundedSemaphore(PARALLEL_JOBS)
+# Languages rendered at the same time in multi-language mode, so one language's
+# concatenation (disk bound) overlaps the next one's encoding.
+LANGUAGE_JOBS = 2
+# Single-process renders (one graph for all clips) let ffmpeg run the filter graph on every core
+FILTER_THREADS = os.cpu_count() or 1
+# ffmpeg/ffprobe executables; main() replaces them with their full paths
+FFMPEG = "ffmpeg"
+FFPROBE = "ffprobe"
+# Keeping inherited descriptors open (Python creates them non-inheritable anyway)
+# lets subprocess start ffmpeg with posix_spawn instead of fork + exec.
+SPAWN_ARGS = {"close_fds": False} if os.name == "posix" else {}
+# Write each final ffmpeg command to "<output>.cmd" (--dump-cmd)
+DUMP_COMMANDS = False
+
+# H.264 encoders selectable with --hwaccel. Scaling and subtitle burn-in stay on
+# the CPU; "filter" uploads the finished frames for encoders that need it.
+VIDEO_ENCODERS = {
+    "none": {"input_args": [], "filter": "",
+             "codec_args": ["-c:v", "libx264", "-preset", "slow", "-crf", "20", "-pix_fmt", "yuv420p"]},
+    "nvenc": {"input_args": [], "filter": "",
+              "codec_args": ["-c:v", "h264_nvenc", "-preset", "p4", "-cq", "20", "-pix_fmt", "yuv420p"]},
+    "vaapi": {"input_args": ["-vaapi_device", "/dev/dri/renderD128"], "filter": "format=nv12,hwupload",
+              "codec_args": ["-c:v", "h264_vaapi", "-qp", "20"]},
+    "qsv": {"input_args": [], "filter": "",
+            "codec_args": ["-c:v", "h264_qsv", "-preset", "slow", "-global_quality", "20", "-pix_fmt", "nv12"]},
+    "videotoolbox": {"input_args": [], "filter": "",
+                     "codec_args": ["-c:v", "h264_videotoolbox", "-q:v", "65", "-pix_fmt", "yuv420p"]},
+}
+VIDEO_ENCODER = VIDEO_ENCODERS["none"]
+
+########################################################################
+# JSON files under CACHE_DIR that keep results between runs
+########################################################################
+def load_json_cache(path):
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def save_json_cache(path, data):
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        logging.warning(f"Could not write cache file {path}: {e}")
 
 ########################################################################
 # New helper: extract the internal font name and units per em from a TTF file using fontTools
 ########################################################################
-def get_internal_font_info(ttf_path):
+def read_font_info(ttf_path):
     try:
         from fontTools.ttLib import TTFont
-        font = TTFont(ttf_path)
-        units = font["head"].unitsPerEm
-        internal_name = None
-        # Prefer nameID 4 (Full font name) on Windows
-        for record in font['name'].names:
-            if record.nameID == 4 and record.platformID == 3 and record.platEncID == 1:
-                internal_name = record.toUnicode()
-                break
-        # Fallback to nameID 1 (Font Family)
-        if not internal_name:
+        # The font is memory-mapped and lazy=True only decompiles the tables that
+        # are actually accessed (head, name), so only those pages are read.
+        with open(ttf_path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            font = TTFont(mm, lazy=True)
+            units = font["head"].unitsPerEm
+            internal_name = None
+            # Prefer nameID 4 (Full font name) on Windows
             for record in font['name'].names:
-                if record.nameID == 1 and record.platformID == 3 and record.platEncID == 1:
+                if record.nameID == 4 and record.platformID == 3 and record.platEncID == 1:
                     internal_name = record.toUnicode()
                     break
-        return internal_name, units
+            # Fallback to nameID 1 (Font Family)
+            if not internal_name:
+                for record in font['name'].names:
+                    if record.nameID == 1 and record.platformID == 3 and record.platEncID == 1:
+                        internal_name = record.toUnicode()
+                        break
+            return internal_name, units
     except Exception as e:
         logging.error(f"Could not extract internal font info from {ttf_path}: {e}")
     return None, None
 
+@functools.lru_cache(maxsize=None)
+def get_internal_font_info(ttf_path):
+    # Parsed results are kept in FONT_CACHE_FILE, keyed by absolute path and
+    # invalidated when the font file's size or mtime changes.
+    try:
+        st = os.stat(ttf_path)
+    except OSError:
+        return read_font_info(ttf_path)
+    key = os.path.abspath(ttf_path)
+    stamp = [st.st_size, st.st_mtime_ns]
+    cache = load_json_cache(FONT_CACHE_FILE)
+    entry = cache.get(key)
+    if entry and entry.get("stamp") == stamp:
+        return entry["name"], entry["units"]
+    internal_name, units = read_font_info(ttf_path)
+    if units is not None:
+        cache[key] = {"stamp": stamp, "name": internal_name, "units": units}
+        save_json_cache(FONT_CACHE_FILE, cache)
+    return internal_name, units
+
 ########################################################################
 # Modified font resolution that only searches the local "fonts" folder
 # and uses the internal font name if possible.
 ########################################################################
+@functools.lru_cache(maxsize=None)
+def list_local_fonts():
+    # Lowercase file name -> path for every file in the local "fonts" folder,
+    # listed once so lookups don't stat candidate paths one by one.
+    try:
+        return {f.lower(): os.path.join(DEFAULT_FONTS_DIR, f) for f in os.listdir(DEFAULT_FONTS_DIR)}
+    except OSError:
+        return {}
+
+@functools.lru_cache(maxsize=None)
 def resolve_font(font_arg):
     ttf_path = None
     # If a file path is provided:
@@ -114,17 +247,24 @@ def resolve_font(font_arg):
         logging.info(f"Resolved font path from given value: {abs_path}")
         ttf_path = abs_path
     else:
-        script_dir = os.path.dirname(os.path.realpath(__file__))
-        fonts_folder = os.path.join(script_dir, "fonts")
-        possible_path = os.path.join(fonts_folder, font_arg)
-        if os.path.exists(possible_path):
-            logging.info(f"Found font in local fonts folder: {possible_path}")
-            ttf_path = possible_path
-        elif not os.path.splitext(font_arg)[1]:
-            possible_path_ttf = os.path.join(fonts_folder, font_arg + ".ttf")
-            if os.path.exists(possible_path_ttf):
-                logging.info(f"Found font in local fonts folder with .ttf appended: {possible_path_ttf}")
-                ttf_path = possible_path_ttf
+        candidates = [font_arg]
+        if not os.path.splitext(font_arg)[1]:
+            candidates.append(font_arg + ".ttf")
+        # Relative paths inside the fonts folder first, then the basename index.
+        for name in candidates:
+            possible_path = os.path.join(DEFAULT_FONTS_DIR, name)
+            if os.path.isfile(possible_path):
+                ttf_path = possible_path
+                break
+        else:
+            local_fonts = list_local_fonts()
+            for name in candidates:
+                possible_path = local_fonts.get(name.lower())
+                if possible_path:
+                    ttf_path = possible_path
+                    break
+        if ttf_path:
+            logging.info(f"Found font in local fonts folder: {ttf_path}")
     if not ttf_path:
         logging.error(f"Font '{font_arg}' not found in the local fonts folder or as a direct file path.")
         return font_arg, None, None
@@ -142,13 +282,30 @@ def resolve_font(font_arg):
 ########################################################################
 # Other utility functions
 ########################################################################
+class CharTable(dict):
+    # str.translate() table that classifies each code point on first use and
+    # remembers the answer, so Unicode-aware filters run as a single C loop.
+    def __init__(self, keep, replacement=None):
+        super().__init__()
+        self.keep = keep
+        self.replacement = replacement
+
+    def __missing__(self, codepoint):
+        value = codepoint if self.keep(chr(codepoint)) else self.replacement
+        self[codepoint] = value
+        return value
+
+# Same character classes as the regexes they replace: \w, [\w\-.] and [a-z'\-]
+WORD_CHARS_TABLE = CharTable(lambda c: c.isalnum() or c == "_")
+FILENAME_CHARS_TABLE = CharTable(lambda c: c.isalnum() or c in "_-.", "_")
+SLUG_CHARS_TABLE = CharTable(lambda c: "a" <= c <= "z" or c in "'-")
+
 def sanitize_filename(filename):
-    return re.sub(r"[^\w\-.]", "_", filename)
+    return filename.translate(FILENAME_CHARS_TABLE)
 
 def create_filename_from_phrase(phrase, video_size):
-    sanitized = phrase.strip().lower()
-    sanitized = re.sub(r"\s+", "-", sanitized)
-    sanitized = re.sub(r"[^a-z'\-]", "", sanitized)
+    sanitized = "-".join(phrase.lower().split())
+    sanitized = sanitized.translate(SLUG_CHARS_TABLE)
     return f"{video_size}-{sanitized}"
 
 def parse_args():
@@ -165,62 +322,280 @@ def parse_args():
     parser.add_argument("--output-dir", type=str, default=None, help="Directory where the final video(s) will be saved")
     parser.add_argument("--font", type=str, default=None, help="Default font name or full path to TTF file for overlays")
     parser.add_argument("--font_size", type=int, default=None, help="Optional font size to use for the main phrase (translation and website sizes will scale proportionally)")
+    parser.add_argument("--two-pass", action="store_true", default=False,
+                        help="Render each video separately and concatenate afterwards instead of a single ffmpeg pass (useful for debugging)")
+    parser.add_argument("--parallel", type=int, default=None, help="Number of videos processed at the same time (default: CPU count / threadcount)")
+    parser.add_argument("--hwaccel", type=str, default="none",
+                        choices=["auto", "nvenc", "vaapi", "qsv", "videotoolbox", "none"],
+                        help="Hardware H.264 encoder to use; 'auto' picks the first one that works (default none)")
+    parser.add_argument("--encoder", type=str, default=None,
+                        help="ffmpeg video encoder to use as is (e.g. hevc_nvenc); overrides --hwaccel")
+    parser.add_argument("--force", action="store_true", default=False,
+                        help="Render outputs even if they are up to date with their inputs")
+    parser.add_argument("--verbose", action="store_true", default=False,
+                        help="Debug logging, including the full ffmpeg command lines and filter graphs")
+    parser.add_argument("--dump-cmd", action="store_true", default=False,
+                        help="Write each ffmpeg command to a .cmd file next to the video it creates")
+    parser.add_argument("--install_deps", action="store_true", default=False,
+                        help="Reinstall the packages from requirements.txt before running")
+    parser.add_argument("--threadcount", type=int, default=FFMPEG_THREADS, help=f"Threads used by each ffmpeg process (default {FFMPEG_THREADS})")
     args = parser.parse_args()
     logging.info("Command line arguments parsed successfully.")
     return args
 
+def encoder_works(encoder):
+    # Listing an encoder does not mean the device is present, so run a tiny test encode.
+    video_filter = "format=yuv420p"
+    if encoder["filter"]:
+        video_filter += "," + encoder["filter"]
+    cmd = ([FFMPEG, "-hide_banner", "-loglevel", "error"] + encoder["input_args"] +
+           ["-f", "lavfi", "-i", "color=c=black:s=256x256:d=0.1", "-vf", video_filter] +
+           encoder["codec_args"] + ["-f", "null", "-"])
+    with FFMPEG_SLOTS:
+        return subprocess.run(cmd, stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                              **SPAWN_ARGS).returncode == 0
+
+def detect_video_encoder(hwaccel):
+    if hwaccel == "none":
+        return "none"
+    try:
+        with FFMPEG_SLOTS:
+            result = subprocess.run([FFMPEG, "-hide_banner", "-encoders"], check=True, capture_output=True,
+                                    text=True, stdin=subprocess.DEVNULL, **SPAWN_ARGS)
+        available = result.stdout
+    except Exception as e:
+        logging.warning(f"Could not list ffmpeg encoders: {e}")
+        available = ""
+    candidates = ["nvenc", "vaapi", "qsv", "videotoolbox"] if hwaccel == "auto" else [hwaccel]
+    for name in candidates:
+        if f"h264_{name}" in available and encoder_works(VIDEO_ENCODERS[name]):
+            return name
+        if hwaccel != "auto":
+            logging.warning(f"Hardware encoder h264_{name} is not usable; falling back to libx264.")
+    return "none"
+
+def encoder_from_name(name):
+    for encoder in VIDEO_ENCODERS.values():
+        if encoder["codec_args"][1] == name:
+            return encoder
+    return {"input_args": [], "filter": "", "codec_args": ["-c:v", name, "-pix_fmt", "yuv420p"]}
+
+def concat_filter(concat_inputs, num_inputs, label=""):
+    if VIDEO_ENCODER["filter"]:
+        return (f"{concat_inputs}concat=n={num_inputs}:v=1:a=1[vc{label}][a{label}];"
+                f"[vc{label}]{VIDEO_ENCODER['filter']}[v{label}]")
+    return f"{concat_inputs}concat=n={num_inputs}:v=1:a=1[v{label}][a{label}]"
+
+def run_ffmpeg(cmd, description, input=None):
+    # Only a one-line summary is logged at INFO; the full command line is built only
+    # when DEBUG logging is on. stderr is collected and shown only if ffmpeg fails.
+    logging.info(f"Executing {description} FFmpeg command -> {cmd[-1]}")
+    if logging.getLogger().isEnabledFor(logging.DEBUG):
+        logging.debug("FFmpeg command: " + shlex.join(cmd))
+    if DUMP_COMMANDS:
+        dump_command(cmd, input)
+    with FFMPEG_SLOTS:
+        result = subprocess.run(cmd, input=input, stdin=None if input is not None else subprocess.DEVNULL,
+                                stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, **SPAWN_ARGS)
+    if result.returncode != 0:
+        stderr = result.stderr.decode("utf-8", "replace")[-4000:]
+        logging.error(f"ffmpeg exited with code {result.returncode}:\n{stderr}")
+        raise subprocess.CalledProcessError(result.returncode, cmd, stderr=stderr)
+
+def dump_command(cmd, input=None):
+    # The filter script is deleted after the run, so the dump inlines the graph
+    # to stay runnable on its own.
+    dumped = list(cmd)
+    if "-filter_complex_script" in dumped:
+        i = dumped.index("-filter_complex_script")
+        with open(dumped[i + 1], encoding="utf-8") as f:
+            dumped[i:i + 2] = ["-filter_complex", f.read()]
+    cmd_path = cmd[-1] + ".cmd"
+    try:
+        # Data fed through stdin (the concat list) is saved next to the .cmd file
+        # and read from there instead of pipe:0.
+        if input is not None and "pipe:0" in dumped:
+            input_path = cmd[-1] + ".input.txt"
+            with open(input_path, "wb") as f:
+                f.write(input)
+            dumped[dumped.index("pipe:0")] = input_path
+        with open(cmd_path, "w", encoding="utf-8") as f:
+            f.write(shlex.join(dumped) + "\n")
+        logging.info(f"FFmpeg command written to {cmd_path}")
+    except OSError as e:
+        logging.warning(f"Could not write {cmd_path}: {e}")
+
+def write_filter_script(filter_complex):
+    # Graphs grow with the number of clips; passing them via -filter_complex_script
+    # keeps them off the command line (and clear of the OS argument size limit).
+    with tempfile.NamedTemporaryFile("w", suffix=".txt", delete=False, encoding="utf-8") as f:
+        f.write(filter_complex)
+    logging.info(f"Filter graph written to {f.name}")
+    logging.debug("Filter graph: %s", filter_complex)
+    return f.name
+
+VIDEO_EXTS = (".mp4", ".mkv", ".avi", ".mov")
+# Demuxer to try first for each extension, so ffmpeg/PyAV skip format probing.
+DEMUXER_BY_EXT = {".mp4": "mov", ".mov": "mov", ".mkv": "matroska", ".avi": "avi"}
+
+# ffmpeg messages for an input the forced demuxer could not open
+INPUT_OPEN_ERRORS = ("Invalid data found when processing input", "Error opening input")
+# ffmpeg message when an input has nothing to map (here: no subtitle stream)
+NO_STREAM_ERROR = "does not contain any stream"
+
+def demuxer_hint(video_path):
+    return DEMUXER_BY_EXT.get(os.path.splitext(video_path)[1].lower())
+
 def get_video_files(folder):
-    exts = [".mp4", ".mkv", ".avi", ".mov"]
     files = []
-    for f in os.listdir(folder):
-        if os.path.splitext(f)[1].lower() in exts:
-            if f.lower().startswith("output") or f.lower().startswith("processed_"):
+    # scandir entries carry the file type, so filtering needs no extra stat calls.
+    with os.scandir(folder) as entries:
+        for entry in entries:
+            name = entry.name.lower()
+            if not name.endswith(VIDEO_EXTS) or not entry.is_file():
+                continue
+            if name.startswith("output") or name.startswith("processed_"):
                 continue
-            files.append(f)  # store relative filenames
+            files.append(entry.name)  # store relative filenames
     files = sorted(files)
     logging.info(f"Found {len(files)} video files in the folder: {folder}")
     return files
 
-def extract_subtitles(video_path, output_srt):
-    logging.info(f"Extracting subtitles from {video_path} to {output_srt}")
-    cmd = ["ffmpeg", "-y", "-loglevel", "error", "-i", video_path, "-map", "0:s:0?", output_srt]
-    subprocess.run(cmd, check=True)
+def extract_subtitles(video_path):
+    logging.info(f"Extracting subtitles from {video_path}")
+    # Subtitle extraction is demux-only work; one thread avoids contention
+    # when many extractions run side by side. The SRT is read from stdout.
+    cmd = [FFMPEG, "-hide_banner", "-nostats", "-loglevel", "error", "-i", video_path, "-map", "0:s:0?",
+           "-threads", "1", "-f", "srt", "pipe:1"]
+    def run(format_args):
+        with FFMPEG_SLOTS:
+            return subprocess.run(cmd[:5] + format_args + cmd[5:], stdin=subprocess.DEVNULL,
+                                  stdout=subprocess.PIPE, stderr=subprocess.PIPE, **SPAWN_ARGS)
+
+    demuxer = demuxer_hint(video_path)
+    result = run(["-f", demuxer] if demuxer else [])
+    stderr = result.stderr.decode("utf-8", "replace")
+    # Only a file the hinted demuxer could not open is tried again with format detection;
+    # any other failure would fail the same way twice.
+    if result.returncode != 0 and demuxer and any(error in stderr for error in INPUT_OPEN_ERRORS):
+        logging.info(f"Demuxer '{demuxer}' did not match {video_path}; letting ffmpeg detect the format.")
+        result = run([])
+        stderr = result.stderr.decode("utf-8", "replace")
+    if result.returncode != 0 and NO_STREAM_ERROR in stderr:
+        # "-map 0:s:0?" matched nothing: the file has no subtitle stream, which is an
+        # empty result (and gets cached as such), not an error.
+        logging.info(f"{video_path} has no subtitle stream.")
+        return ""
+    if result.returncode != 0:
+        raise subprocess.CalledProcessError(result.returncode, result.args, output=result.stdout, stderr=stderr)
     logging.info("Subtitles extracted successfully.")
+    return result.stdout.decode("utf-8", "replace")
+
+SRT_TIME_LINE_RE = re.compile(r'(\d+:\d+:\d+,\d+)\s*-->\s*(\d+:\d+:\d+,\d+)')
+SRT_TIME_RE = re.compile(r'(\d+):(\d+):(\d+),(\d+)')
+UNDERLINE_RE = re.compile(r'<u>(.*?)</u>')
+UNDERLINE_TAG_RE = re.compile(r'</?u>')
 
 def srt_time_to_seconds(time_str):
-    h, m, s_ms = time_str.split(":")
-    s, ms = s_ms.split(",")
+    h, m, s, ms = SRT_TIME_RE.match(time_str).groups()
     return int(h)*3600 + int(m)*60 + int(s) + int(ms)/1000.0
 
-def parse_srt(srt_path):
-    logging.info(f"Parsing SRT file: {srt_path}")
-    cues = []
+def make_cue(start, end, text):
+    # Only cues with an underlined (highlighted) word are of interest.
+    highlighted = UNDERLINE_RE.search(text)
+    if highlighted:
+        return {"start": start, "end": end, "text": text, "highlight": highlighted.group(1)}
+    return None
+
+def iter_srt_cues(lines):
+    # Cues are blocks of non-blank lines: index, "start --> end", then text.
+    # Only the current block is held in memory; each finished cue is yielded.
+    block = []
+    for line in itertools.chain(lines, [""]):
+        line = line.rstrip("\r\n")
+        if line.strip():
+            block.append(line)
+            continue
+        if len(block) >= 3:
+            m = SRT_TIME_LINE_RE.match(block[1])
+            if m:
+                cue = make_cue(srt_time_to_seconds(m.group(1)), srt_time_to_seconds(m.group(2)),
+                               " ".join(block[2:]).rstrip())
+                if cue:
+                    yield cue
+        block = []
+
+def parse_srt_text(content):
+    # Iterating a StringIO yields one line at a time instead of splitting the whole text up front.
+    cues = list(iter_srt_cues(io.StringIO(content, newline=None)))
+    logging.info(f"Found {len(cues)} cues in the SRT text.")
+    return cues
+
+def mov_text_to_srt_text(payload):
+    # mov_text sample: 16-bit text length, UTF-8 text, then optional boxes.
+    # Underline lives in the face-style flags (0x04) of the "styl" box records.
+    if len(payload) < 2:
+        return ""
+    text_len = int.from_bytes(payload[:2], "big")
+    text = payload[2:2 + text_len].decode("utf-8", "replace")
+    underlined = []
+    pos = 2 + text_len
+    while pos + 8 <= len(payload):
+        box_size = int.from_bytes(payload[pos:pos + 4], "big")
+        if box_size < 8:
+            break
+        if payload[pos + 4:pos + 8] == b"styl" and pos + 10 <= len(payload):
+            count = int.from_bytes(payload[pos + 8:pos + 10], "big")
+            for i in range(count):
+                rec = pos + 10 + i * 12
+                if rec + 12 > min(pos + box_size, len(payload)):
+                    break
+                if payload[rec + 6] & 0x04:
+                    underlined.append((int.from_bytes(payload[rec:rec + 2], "big"),
+                                       int.from_bytes(payload[rec + 2:rec + 4], "big")))
+        pos += box_size
+    for start_char, end_char in sorted(underlined, reverse=True):
+        text = text[:start_char] + "<u>" + text[start_char:end_char] + "</u>" + text[end_char:]
+    return text
+
+def read_subtitle_cues(video_path):
+    # In-process alternative to extract_subtitles + parse_srt_text using the optional
+    # PyAV package. Returns None when PyAV is missing or the track is not
+    # subrip/mov_text, so the caller can fall back to ffmpeg.
+    try:
+        import av
+    except ImportError:
+        return None
     try:
-        with open(srt_path, encoding='utf-8') as f:
-            content = f.read().strip()
+        with av.open(video_path, format=demuxer_hint(video_path)) as container:
+            stream = next((s for s in container.streams if s.type == "subtitle"), None)
+            if stream is None:
+                return []
+            codec_name = stream.codec_context.name
+            if codec_name not in ("subrip", "mov_text"):
+                return None
+            cues = []
+            for packet in container.demux(stream):
+                if packet.pts is None or not packet.size:
+                    continue
+                payload = bytes(packet)
+                if codec_name == "mov_text":
+                    text = mov_text_to_srt_text(payload)
+                else:
+                    text = payload.decode("utf-8", "replace")
+                start = float(packet.pts * stream.time_base)
+                end = start + float((packet.duration or 0) * stream.time_base)
+                cue = make_cue(start, end, " ".join(line for line in text.splitlines() if line.strip()).rstrip())
+                if cue:
+                    cues.append(cue)
     except Exception as e:
-        logging.error(f"Error reading SRT file: {e}")
-        return cues
-    if not content:
-        return cues
-    parts = re.split(r'\n\s*\n', content)
-    for part in parts:
-        lines = part.strip().splitlines()
-        if len(lines) >= 3:
-            time_line = lines[1]
-            text = " ".join(lines[2:])
-            m = re.match(r'(\d+:\d+:\d+,\d+)\s*-->\s*(\d+:\d+:\d+,\d+)', time_line)
-            if m:
-                start = srt_time_to_seconds(m.group(1))
-                end = srt_time_to_seconds(m.group(2))
-                highlighted = re.findall(r'<u>(.*?)</u>', text)
-                if highlighted:
-                    cues.append({"start": start, "end": end, "text": text, "highlight": highlighted[0]})
-    logging.info(f"Found {len(cues)} cues in the SRT file.")
+        logging.warning(f"PyAV could not read subtitles from {video_path} ({e}); using ffmpeg instead.")
+        return None
+    logging.info(f"Read {len(cues)} cues from {video_path} in-process.")
     return cues
 
 def clean_text(text):
-    return re.sub(r'</?u>', '', text)
+    return UNDERLINE_TAG_RE.sub('', text)
 
 def get_full_phrase_from_cues(cues):
     if cues:
@@ -230,75 +605,208 @@ def get_full_phrase_from_cues(cues):
     logging.info("No cues found – returning an empty phrase.")
     return ""
 
-def translate_text(text, target_language="ru"):
-    if not text.strip():
-        logging.info("Empty text for translation – returning an empty string.")
-        return ""
-    logging.info(f"Sending request to translate text to {target_language}: {text}")
-    url = "https://translation.googleapis.com/language/translate/v2"
-    params = {"q": text, "target": target_language, "key": GOOGLE_API_KEY}
-    response = requests.post(url, data=params)
-    if response.status_code == 200:
-        data = response.json()
-        translated_text = data["data"]["translations"][0]["translatedText"]
-        logging.info(f"Translation received: {translated_text}")
-        return translated_text
-    else:
-        logging.error(f"Translate API error: {response.text}")
-        return ""
+def translate_texts(texts, target_language="ru"):
+    # One request carries many phrases: the v2 API accepts a repeated "q" field
+    # and returns the translations in the same order.
+    # Each distinct text is sent once; earlier results are served from TRANSLATION_CACHE,
+    # which is backed by one JSON file per language so repeat runs need no requests.
+    cache_path = os.path.join(TRANSLATION_CACHE_DIR, f"{sanitize_filename(target_language)}.json")
+    stored = load_json_cache(cache_path)
+    for text, translation in stored.items():
+        TRANSLATION_CACHE.setdefault((text, target_language), translation)
+    pending = list(dict.fromkeys(text for text in texts
+                                 if text.strip() and (text, target_language) not in TRANSLATION_CACHE))
+    if not any(text.strip() for text in texts):
+        logging.info("Empty text for translation – returning empty strings.")
+    for offset in range(0, len(pending), TRANSLATE_BATCH_SIZE):
+        batch = pending[offset:offset + TRANSLATE_BATCH_SIZE]
+        logging.info(f"Sending request to translate {len(batch)} phrase(s) to {target_language}")
+        params = [("q", text) for text in batch]
+        params += [("target", target_language), ("key", GOOGLE_API_KEY)]
+        try:
+            response = TRANSLATE_SESSION.post(TRANSLATE_URL, data=params, timeout=TRANSLATE_TIMEOUT)
+        except requests.RequestException as e:
+            logging.error(f"Translate request failed: {e}")
+            continue
+        if response.status_code == 200:
+            data = response.json()
+            for text, item in zip(batch, data["data"]["translations"]):
+                TRANSLATION_CACHE[(text, target_language)] = item["translatedText"]
+                stored[text] = item["translatedText"]
+                logging.info("Translation received: %s -> %s", text, item["translatedText"])
+        else:
+            logging.error(f"Translate API error: {response.text}")
+    if pending:
+        save_json_cache(cache_path, stored)
+    return [TRANSLATION_CACHE.get((text, target_language), "") for text in texts]
+
+ASS_COLORS = {
+    "white": "&H00FFFFFF",
+    "black": "&H00000000",
+    "yellow": "&H0031D1FD",
+    "red": "&H000000FF",
+    "green": "&H0000FF00",
+    "blue": "&H00FF0000",
+    "cyan": "&H00FFFF00",
+    "gray": "&H00AAAAAA",
+    "transparent": "&HFF000000",
+}
 
 def convert_color(color_name):
-    colors = {
-        "white": "&H00FFFFFF",
-        "black": "&H00000000",
-        "yellow": "&H0031D1FD",
-        "red": "&H000000FF",
-        "green": "&H0000FF00",
-        "blue": "&H00FF0000",
-        "cyan": "&H00FFFF00",
-        "gray": "&H00AAAAAA",
-        "transparent": "&HFF000000",
-    }
-    return colors.get(color_name.lower(), "&H00FFFFFF")
+    return ASS_COLORS.get(color_name.lower(), "&H00FFFFFF")
 
-def seconds_to_ass_time(seconds):
-    h = int(seconds // 3600)
-    m = int((seconds % 3600) // 60)
-    s = seconds % 60
-    return f"{h}:{m:02d}:{s:05.2f}"
+# ASS colour codes of the configured colours, resolved once at startup
+PHRASE_COLOR_ASS = convert_color(PHRASE_COLOR)
+PHRASE_HIGHLITE_COLOR_ASS = convert_color(PHRASE_HIGHLITE_COLOR)
+WORD_HIGHLITE_COLOR_ASS = convert_color(WORD_HIGHLITE_COLOR)
+TRANSLATION_COLOR_ASS = convert_color(TRANSLATION_COLOR)
+WEBSITE_COLOR_ASS = convert_color(WEBSITE_COLOR)
+TRANSPARENT_COLOR_ASS = convert_color("transparent")
 
+@functools.lru_cache(maxsize=4096)
+def seconds_to_ass_time(seconds):
+    # Whole centiseconds, so a value like 59.999 rolls over to the next minute
+    # instead of printing "60.00" seconds.
+    cs = int(round(seconds * 100))
+    h, cs = divmod(cs, 360000)
+    m, cs = divmod(cs, 6000)
+    s, cs = divmod(cs, 100)
+    return f"{h}:{m:02d}:{s:02d}.{cs:02d}"
+
+@functools.lru_cache(maxsize=4096)
 def normalize_word(w: str) -> str:
-    return re.sub(r"[^\w]+", "", w.lower())
+    return w.lower().translate(WORD_CHARS_TABLE)
 
 def find_subsequence_indices(phrase_words, highlite_words):
     if not highlite_words or not phrase_words:
         return []
     L = len(highlite_words)
     N = len(phrase_words)
-    for start_idx in range(N - L + 1):
-        if all(phrase_words[start_idx + j] == highlite_words[j] for j in range(L)):
-            logging.info(f"Found subsequence starting at index {start_idx}")
-            return list(range(start_idx, start_idx + L))
+    # Jump between occurrences of the first word and compare whole slices,
+    # keeping both the scan and the comparison in C.
+    first_word = highlite_words[0]
+    start_idx = -1
+    try:
+        while True:
+            start_idx = phrase_words.index(first_word, start_idx + 1, N - L + 1)
+            if phrase_words[start_idx:start_idx + L] == highlite_words:
+                logging.info(f"Found subsequence starting at index {start_idx}")
+                return list(range(start_idx, start_idx + L))
+    except ValueError:
+        pass
     logging.info("Continuous subsequence not found.")
     return []
 
-def contains_contiguous_subsequence(lst, sub):
-    L = len(sub)
-    for i in range(len(lst) - L + 1):
-        if lst[i:i+L] == sub:
-            return True
-    return False
+########################################################################
+# Longest common run of words across phrases (generalized suffix array + LCP)
+########################################################################
+def build_suffix_array(tokens):
+    # Prefix doubling over integer token ids.
+    n = len(tokens)
+    sa = list(range(n))
+    rank = list(tokens)
+    tmp = [0] * n
+    k = 1
+    while n > 1:
+        def key(i):
+            return (rank[i], rank[i + k] if i + k < n else -1)
+        sa.sort(key=key)
+        tmp[sa[0]] = 0
+        for idx in range(1, n):
+            tmp[sa[idx]] = tmp[sa[idx - 1]] + (key(sa[idx - 1]) < key(sa[idx]))
+        rank, tmp = tmp, rank
+        if rank[sa[-1]] == n - 1:
+            break
+        k <<= 1
+    return sa
+
+def build_lcp_array(tokens, sa):
+    # Kasai: lcp[i] is the common prefix length of suffixes sa[i - 1] and sa[i].
+    n = len(tokens)
+    rank = [0] * n
+    for i, s in enumerate(sa):
+        rank[s] = i
+    lcp = [0] * n
+    h = 0
+    for i in range(n):
+        if rank[i] > 0:
+            j = sa[rank[i] - 1]
+            while i + h < n and j + h < n and tokens[i + h] == tokens[j + h]:
+                h += 1
+            lcp[rank[i]] = h
+            if h > 0:
+                h -= 1
+        else:
+            h = 0
+    return lcp
+
+def build_generalized_suffix_array(normalized_lists):
+    # Words get ids after the per-list sentinels, so every sentinel is unique
+    # and no common prefix can run across two lists.
+    k = len(normalized_lists)
+    vocab = {}
+    tokens, owners, words = [], [], []
+    for owner, word_list in enumerate(normalized_lists):
+        for w in word_list:
+            tokens.append(vocab.setdefault(w, k + len(vocab)))
+            owners.append(owner)
+            words.append(w)
+        tokens.append(owner)
+        owners.append(-1)
+        words.append("")
+    sa = build_suffix_array(tokens)
+    lcp = build_lcp_array(tokens, sa)
+    return tokens, owners, words, sa, lcp
+
+def longest_common_run(gsa, min_lists):
+    # Sliding window over the suffix array: every window holding suffixes from at
+    # least min_lists different lists shares a prefix of min(lcp) words.
+    tokens, owners, words, sa, lcp = gsa
+    counts = {}
+    window_min = collections.deque()
+    best_len = 0
+    lo = 0
+    for hi in range(len(sa)):
+        owner = owners[sa[hi]]
+        if owner >= 0:
+            counts[owner] = counts.get(owner, 0) + 1
+        if hi > lo:
+            while window_min and lcp[window_min[-1]] >= lcp[hi]:
+                window_min.pop()
+            window_min.append(hi)
+        while len(counts) >= min_lists and hi > lo:
+            best_len = max(best_len, lcp[window_min[0]])
+            owner = owners[sa[lo]]
+            if owner >= 0:
+                counts[owner] -= 1
+                if not counts[owner]:
+                    del counts[owner]
+            lo += 1
+            while window_min and window_min[0] <= lo:
+                window_min.popleft()
+    if not best_len:
+        return ""
 
-def common_contiguous_subsequence(normalized_lists):
-    first = normalized_lists[0]
-    n = len(first)
-    for length in range(n, 0, -1):
-        for start in range(0, n - length + 1):
-            candidate = first[start:start+length]
-            if all(contains_contiguous_subsequence(other, candidate) for other in normalized_lists[1:]):
-                candidate_str = " ".join(candidate)
-                return candidate_str
-    return ""
+    # Every run of best_len words shared by enough lists is one block of adjacent
+    # suffixes with lcp >= best_len; note which lists hold it and where it starts first.
+    candidates = []
+    first_pos = {}
+    for idx in range(len(sa) + 1):
+        if idx < len(sa) and idx > 0 and lcp[idx] >= best_len:
+            owner = owners[sa[idx]]
+            first_pos[owner] = min(first_pos.get(owner, sa[idx]), sa[idx])
+            continue
+        if len(first_pos) >= min_lists:
+            candidates.append(first_pos)
+        if idx < len(sa):
+            first_pos = {owners[sa[idx]]: sa[idx]}
+    # Pick the same run as checking groups of lists in itertools.combinations
+    # order and scanning the first list of the group from the left: the
+    # lexicographically smallest group that shares a run wins, then the run
+    # that starts earliest in the group's first list.
+    group = min(tuple(sorted(c)[:min_lists]) for c in candidates)
+    start = min(c[group[0]] for c in candidates if set(group) <= c.keys())
+    return " ".join(words[start:start + best_len])
 
 def calculate_highlight_phrase(phrases):
     if not phrases:
@@ -312,24 +820,78 @@ def calculate_highlight_phrase(phrases):
         return ""
     if len(normalized_phrases) == 1:
         return " ".join(normalized_phrases[0])
-    candidate = common_contiguous_subsequence(normalized_phrases)
+    gsa = build_generalized_suffix_array(normalized_phrases)
+    total = len(normalized_phrases)
+    candidate = longest_common_run(gsa, total)
     if candidate:
         logging.info(f"Found common contiguous subsequence for all phrases: '{candidate}'")
         return candidate
-    total = len(normalized_phrases)
+    # The same suffix array answers "shared by at least r phrases" for any r,
+    # so there is no need to enumerate subsets of phrases.
     for r in range(total - 1, 1, -1):
-        best_candidate = ""
-        for subset in itertools.combinations(normalized_phrases, r):
-            candidate = common_contiguous_subsequence(list(subset))
-            if candidate and len(candidate.split()) > len(best_candidate.split()):
-                best_candidate = candidate
-        if best_candidate:
-            logging.info(f"Found common contiguous subsequence for a subset of size {r}: '{best_candidate}'")
-            return best_candidate
+        candidate = longest_common_run(gsa, r)
+        if candidate:
+            logging.info(f"Found common contiguous subsequence for a subset of size {r}: '{candidate}'")
+            return candidate
     logging.info("No common contiguous subsequence found even in subsets.")
     return ""
 
-def generate_ass_subtitles(cues, phrase, translation, video_width, video_height, highlite_phrase):
+@functools.lru_cache(maxsize=None)
+def ass_header(video_width, video_height, final_phrase_font_size, final_translation_font_size):
+    # Script info, styles and the events format line. Clips of the same size and
+    # font sizes share it; fonts and colours are fixed once main() has applied
+    # the command line.
+    scale = video_width / 640.0
+    scaled_website_font_size = int(round(WEBSITE_FONT_SIZE * scale))
+    scaled_phrase_margin_v = int(round(PHRASE_MARGIN_V * scale))
+    scaled_translation_margin_v = int(round(TRANSLATION_MARGIN_V * scale))
+    scaled_website_margin_v = int(round(WEBSITE_MARGIN_V * scale))
+    scaled_margin_lr = int(round(10 * scale))
+    scaled_outline = int(round(2 * scale))
+
+    out = []
+    out.append("[Script Info]\n")
+    out.append("ScriptType: v4.00+\n")
+    out.append(f"PlayResX: {video_width}\n")
+    out.append(f"PlayResY: {video_height}\n")
+    out.append("ScaledBorderAndShadow: yes\n")
+    out.append("WrapStyle: 3\n\n")
+    out.append("[V4+ Styles]\n")
+    out.append("Format: Name,Fontname,Fontsize,PrimaryColour,SecondaryColour,OutlineColour,BackColour,"
+               "Bold,Italic,Underline,StrikeOut,ScaleX,ScaleY,Spacing,Angle,BorderStyle,Outline,Shadow,"
+               "Alignment,MarginL,MarginR,MarginV,Encoding\n")
+    out.append(
+        f"Style: Base,{PHRASE_FONT},{final_phrase_font_size},"
+        f"{PHRASE_COLOR_ASS},{PHRASE_COLOR_ASS},"
+        "&H00000000,&H64000000,0,0,0,0,100,100,0,0,1,"
+        f"{scaled_outline},0,{PHRASE_ALIGNMENT},{scaled_margin_lr},{scaled_margin_lr},{scaled_phrase_margin_v},1\n"
+    )
+    out.append(
+        f"Style: Highlight,{PHRASE_FONT},{final_phrase_font_size},"
+        f"{WORD_HIGHLITE_COLOR_ASS},{TRANSPARENT_COLOR_ASS},"
+        "&H00000000,&H64000000,0,0,0,0,100,100,0,0,1,"
+        f"{scaled_outline},0,{PHRASE_ALIGNMENT},{scaled_margin_lr},{scaled_margin_lr},{scaled_phrase_margin_v},1\n"
+    )
+    out.append(
+        f"Style: Translation,{TRANSLATION_FONT},{final_translation_font_size},"
+        f"{TRANSLATION_COLOR_ASS},{TRANSLATION_COLOR_ASS},"
+        "&H00000000,&H64000000,0,0,0,0,100,100,0,0,1,"
+        f"{scaled_outline},0,{TRANSLATION_ALIGNMENT},{scaled_margin_lr},{scaled_margin_lr},{scaled_translation_margin_v},1\n"
+    )
+    out.append(
+        f"Style: Website,{WEBSITE_FONT},{scaled_website_font_size},"
+        f"{WEBSITE_COLOR_ASS},{WEBSITE_COLOR_ASS},"
+        "&H00000000,&H64000000,0,0,0,0,100,100,0,0,1,"
+        f"{scaled_outline},0,{WEBSITE_ALIGNMENT},{scaled_margin_lr},{scaled_margin_lr},{scaled_website_margin_v},1\n"
+    )
+    out.append("\n[Events]\n")
+    out.append("Format: Layer,Start,End,Style,Name,MarginL,MarginR,MarginV,Effect,Text\n")
+
+    return "".join(out)
+
+def generate_ass_subtitles(cues, phrase, translation, video_width, video_height, highlite_phrase, events="all"):
+    # events="base" writes everything except the translation line (translation is
+    # then only used for font sizing); events="translation" writes only that line.
     logging.info("Starting ASS subtitle generation.")
     if not cues:
         total_start_sec = 0.0
@@ -345,12 +907,6 @@ def generate_ass_subtitles(cues, phrase, translation, video_width, video_height,
     scale = video_width / 640.0
     scaled_phrase_font_size = int(round(PHRASE_FONT_SIZE * scale))
     scaled_translation_font_size = int(round(TRANSLATION_FONT_SIZE * scale))
-    scaled_website_font_size = int(round(WEBSITE_FONT_SIZE * scale))
-    scaled_phrase_margin_v = int(round(PHRASE_MARGIN_V * scale))
-    scaled_translation_margin_v = int(round(TRANSLATION_MARGIN_V * scale))
-    scaled_website_margin_v = int(round(WEBSITE_MARGIN_V * scale))
-    scaled_margin_lr = int(round(10 * scale))
-    scaled_outline = int(round(2 * scale))
 
     # Adjust font sizes to fit within two lines
     if phrase:
@@ -382,78 +938,38 @@ def generate_ass_subtitles(cues, phrase, translation, video_width, video_height,
     logging.info(f"Highlighted word indices: {highlight_indices}")
 
     # Generate ASS content
-    ass = "[Script Info]\n"
-    ass += "ScriptType: v4.00+\n"
-    ass += f"PlayResX: {video_width}\n"
-    ass += f"PlayResY: {video_height}\n"
-    ass += "ScaledBorderAndShadow: yes\n"
-    ass += "WrapStyle: 3\n\n"
-    ass += "[V4+ Styles]\n"
-    ass += ("Format: Name,Fontname,Fontsize,PrimaryColour,SecondaryColour,OutlineColour,BackColour,"
-            "Bold,Italic,Underline,StrikeOut,ScaleX,ScaleY,Spacing,Angle,BorderStyle,Outline,Shadow,"
-            "Alignment,MarginL,MarginR,MarginV,Encoding\n")
-    ass += (
-        f"Style: Base,{PHRASE_FONT},{final_phrase_font_size},"
-        f"{convert_color(PHRASE_COLOR)},{convert_color(PHRASE_COLOR)},"
-        "&H00000000,&H64000000,0,0,0,0,100,100,0,0,1,"
-        f"{scaled_outline},0,{PHRASE_ALIGNMENT},{scaled_margin_lr},{scaled_margin_lr},{scaled_phrase_margin_v},1\n"
-    )
-    ass += (
-        f"Style: Highlight,{PHRASE_FONT},{final_phrase_font_size},"
-        f"{convert_color(WORD_HIGHLITE_COLOR)},{convert_color('transparent')},"
-        "&H00000000,&H64000000,0,0,0,0,100,100,0,0,1,"
-        f"{scaled_outline},0,{PHRASE_ALIGNMENT},{scaled_margin_lr},{scaled_margin_lr},{scaled_phrase_margin_v},1\n"
-    )
-    ass += (
-        f"Style: Translation,{TRANSLATION_FONT},{final_translation_font_size},"
-        f"{convert_color(TRANSLATION_COLOR)},{convert_color(TRANSLATION_COLOR)},"
-        "&H00000000,&H64000000,0,0,0,0,100,100,0,0,1,"
-        f"{scaled_outline},0,{TRANSLATION_ALIGNMENT},{scaled_margin_lr},{scaled_margin_lr},{scaled_translation_margin_v},1\n"
-    )
-    ass += (
-        f"Style: Website,{WEBSITE_FONT},{scaled_website_font_size},"
-        f"{convert_color(WEBSITE_COLOR)},{convert_color(WEBSITE_COLOR)},"
-        "&H00000000,&H64000000,0,0,0,0,100,100,0,0,1,"
-        f"{scaled_outline},0,{WEBSITE_ALIGNMENT},{scaled_margin_lr},{scaled_margin_lr},{scaled_website_margin_v},1\n"
-    )
-    ass += "\n[Events]\n"
-    ass += "Format: Layer,Start,End,Style,Name,MarginL,MarginR,MarginV,Effect,Text\n"
-    
+    out = [ass_header(video_width, video_height, final_phrase_font_size, final_translation_font_size)]
     # Add dialogue lines
-    base_color_ass = convert_color(PHRASE_COLOR)
-    highlite_color_ass = convert_color(PHRASE_HIGHLITE_COLOR)
-    base_line_parts = []
-    for i, w in enumerate(words_original):
-        if i in highlight_indices:
-            part = f"{{\\c{highlite_color_ass}}}{w}{{\\c{base_color_ass}}}"
-        else:
-            part = w
-        base_line_parts.append(part)
-    base_line_text = " ".join(base_line_parts)
-    ass += f"Dialogue: 0,{start_time_ass},{end_time_ass},Base,,0,0,0,,{base_line_text}\n"
-    
-    n_cues = len(cues)
-    n_words = len(words_original)
-    n_min = min(n_cues, n_words)
-    for i in range(n_min):
-        cue = cues[i]
-        w_start = seconds_to_ass_time(cue["start"])
-        w_end = seconds_to_ass_time(cue["end"])
-        highlight_line_parts = []
-        for j, w in enumerate(words_original):
-            if j == i:
-                highlight_line_parts.append(f"{{\\alpha&H00&}}{w}{{\\alpha&HFF&}}")
-            else:
-                highlight_line_parts.append(f"{{\\alpha&HFF&}}{w}")
-        highlight_line_text = " ".join(highlight_line_parts)
-        ass += f"Dialogue: 1,{w_start},{w_end},Highlight,,0,0,0,,{highlight_line_text}\n"
-    
-    if translation.strip():
-        ass += f"Dialogue: 0,{start_time_ass},{end_time_ass},Translation,,0,0,0,,{{\\q3}}{translation}\n"
-    ass += f"Dialogue: 2,{start_time_ass},{end_time_ass},Website,,0,0,0,,{WEBSITE_TEXT}\n"
-    
+    if events != "translation":
+        highlight_set = set(highlight_indices)
+        base_line_text = " ".join(
+            f"{{\\c{PHRASE_HIGHLITE_COLOR_ASS}}}{w}{{\\c{PHRASE_COLOR_ASS}}}" if i in highlight_set else w
+            for i, w in enumerate(words_original)
+        )
+        out.append(f"Dialogue: 0,{start_time_ass},{end_time_ass},Base,,0,0,0,,{base_line_text}\n")
+
+        # Every karaoke line is the whole phrase hidden except word i, so the hidden
+        # words are formatted once and only the visible word changes per cue.
+        alpha_on = "{\\alpha&H00&}"
+        alpha_off = "{\\alpha&HFF&}"
+        hidden_words = [alpha_off + w for w in words_original]
+        n_min = min(len(cues), len(words_original))
+        for i in range(n_min):
+            cue = cues[i]
+            w_start = seconds_to_ass_time(cue["start"])
+            w_end = seconds_to_ass_time(cue["end"])
+            visible_word = alpha_on + words_original[i] + alpha_off
+            highlight_line_text = " ".join(hidden_words[:i] + [visible_word] + hidden_words[i + 1:])
+            out.append(f"Dialogue: 1,{w_start},{w_end},Highlight,,0,0,0,,{highlight_line_text}\n")
+
+    if translation.strip() and events != "base":
+        out.append(f"Dialogue: 0,{start_time_ass},{end_time_ass},Translation,,0,0,0,,{{\\q3}}{translation}\n")
+    if events != "translation":
+        out.append(f"Dialogue: 2,{start_time_ass},{end_time_ass},Website,,0,0,0,,{WEBSITE_TEXT}\n")
+
+    ass = "".join(out)
     logging.info("ASS subtitles generated successfully.")
-    logging.debug("Generated ASS file content:\n" + ass)
+    logging.debug("Generated ASS file content:\n%s", ass)
     return ass
 
 ########################################################################
@@ -463,161 +979,235 @@ def escape_path_for_ffmpeg(path):
     rel_path = os.path.relpath(path, start=os.getcwd())
     return rel_path.replace('\\', '/')
 
-def copy_processed_videos(processed_videos, output_dir):
-    new_tmp_dir = os.path.join(output_dir, "tmp")
-    if not os.path.exists(new_tmp_dir):
-        os.makedirs(new_tmp_dir)
-        logging.info(f"Created directory for copied videos: {new_tmp_dir}")
-    new_processed_videos = []
-    for video in processed_videos:
-        dest_video = os.path.join(new_tmp_dir, os.path.basename(video))
-        try:
-            shutil.copy2(video, dest_video)
-            logging.info(f"Video {video} copied to {dest_video}")
-            new_processed_videos.append(dest_video)
-        except Exception as e:
-            logging.error(f"Error copying {video} to {dest_video}: {e}", exc_info=True)
-    return new_processed_videos
-
-def remove_working_temp_files(tmp_base_dir):
-    for tmp_file in ["concat.sh", "concat_list.txt"]:
-        tmp_file_path = os.path.join(tmp_base_dir, tmp_file)
-        if os.path.exists(tmp_file_path):
-            try:
-                os.remove(tmp_file_path)
-                logging.info(f"Removed temporary file: {tmp_file_path}")
-            except Exception as e:
-                logging.error(f"Error removing temporary file {tmp_file_path}: {e}", exc_info=True)
+def link_or_copy(src, dst):
+    # Staged files are only read, so a hardlink is as good as a copy and costs no I/O.
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copy2(src, dst)
+    return dst
+
+def probe_stream_params(video_path):
+    # Clips rendered by process_video_with_metadata carry a sidecar with their
+    # stream layout (fixed by -map) and encode parameters; anything else is probed.
+    params = load_json_cache(video_path + ".json")
+    if params:
+        return params
+    cmd = [FFPROBE, "-v", "error", "-show_entries",
+           "stream=codec_type,codec_name,width,height,pix_fmt,sample_aspect_ratio,"
+           "r_frame_rate,time_base,sample_rate,channels",
+           "-of", "json", video_path]
+    try:
+        with FFMPEG_SLOTS:
+            result = subprocess.run(cmd, check=True, capture_output=True, text=True,
+                                    stdin=subprocess.DEVNULL, **SPAWN_ARGS)
+        streams = json.loads(result.stdout).get("streams", [])
+    except Exception as e:
+        logging.error(f"Error probing {video_path}: {e}")
+        return None
+    return [sorted(stream.items()) for stream in streams]
+
+def streams_are_uniform(videos):
+    # Each clip is probed once (duplicates share a file) and the probes run side by side.
+    unique_videos = list(dict.fromkeys(videos))
+    with concurrent.futures.ThreadPoolExecutor(max_workers=PARALLEL_JOBS) as executor:
+        params = list(executor.map(probe_stream_params, unique_videos))
+    if any(p is None for p in params):
+        return False
+    return all(p == params[0] for p in params[1:])
 
 ########################################################################
 # Concatenation helper: given a list of processed video files, create the final output.
 ########################################################################
-def concatenate_processed_videos(processed_videos, final_output, base_tmp_dir, video_size):
-    if processed_videos:
-        concat_list_path = os.path.join(base_tmp_dir, "concat_list.txt")
-        try:
-            with open(concat_list_path, "w", encoding="utf-8") as f:
-                for video in processed_videos:
-                    f.write(f"file '{video}'\n")
-            logging.info(f"Concatenation list file created: {concat_list_path}")
-        except Exception as e:
-            logging.error(f"Error creating concatenation list file: {e}", exc_info=True)
-            concat_list_path = None
-
-        concat_sh_path = os.path.join(base_tmp_dir, "concat.sh")
-        old_concat_command = (
-            f"ffmpeg -y -loglevel error -f concat -safe 0 -i {os.path.basename(concat_list_path)} "
-            f"-c:v libx264 -preset slow -crf 20 -pix_fmt yuv420p "
-            f"-colorspace bt709 -color_primaries bt709 -color_trc bt709 -color_range tv "
-            f"-r 30 -c:a aac -b:a 192k {os.path.basename(final_output)}\n"
-        )
-        try:
-            with open(concat_sh_path, "w", encoding="utf-8") as f:
-                f.write(old_concat_command)
-            logging.info(f"concat.sh file created: {concat_sh_path}")
-        except Exception as e:
-            logging.error(f"Error writing concat.sh file: {e}", exc_info=True)
-
-        new_cmd = ["ffmpeg", "-y", "-loglevel", "error"]
-        for video in processed_videos:
-            new_cmd.extend(["-i", video])
-        num_inputs = len(processed_videos)
-        filter_complex_parts = []
-        for i in range(num_inputs):
-            filter_complex_parts.append(f"[{i}:v:0]setsar=1[v{i}];")
-        concat_inputs = ""
-        for i in range(num_inputs):
-            concat_inputs += f"[v{i}][{i}:a:0]"
-        filter_complex_parts.append(f"{concat_inputs}concat=n={num_inputs}:v=1:a=1 [v][a]")
-        filter_complex = " ".join(filter_complex_parts)
-        new_cmd.extend([
-            "-filter_complex", filter_complex,
-            "-map", "[v]", "-map", "[a]",
-            "-c:v", "libx264", "-preset", "slow", "-crf", "20",
-            "-pix_fmt", "yuv420p",
-            "-colorspace", "bt709", "-color_primaries", "bt709",
-            "-color_trc", "bt709", "-color_range", "tv",
-            "-r", "30",
-            "-c:a", "aac", "-b:a", "192k",
-            final_output
-        ])
-        logging.info("Executing final concatenation FFmpeg command: " + " ".join(new_cmd))
+def concat_with_pyav(videos, final_output):
+    # In-process stream copy with the optional PyAV package, for clips that share
+    # stream parameters. Like the concat demuxer, every segment is shifted by the
+    # durations of the ones before it, and (like ffmpeg's muxer) a DTS that would
+    # go backwards at a join is bumped past the previous one. Returns False
+    # (caller uses ffmpeg) when PyAV is missing or the copy fails.
+    try:
+        import av
+    except ImportError:
+        return False
+    try:
+        with av.open(final_output, "w", format="mp4", options={"movflags": "+faststart"}) as out:
+            out_streams = None
+            offset = 0  # seconds
+            last_dts = {}
+            for video in videos:
+                with av.open(video) as inp:
+                    if out_streams is None:
+                        add_stream = getattr(out, "add_stream_from_template", None)
+                        out_streams = [add_stream(s) if add_stream else out.add_stream(template=s)
+                                       for s in inp.streams]
+                    shift = offset - fractions.Fraction(inp.start_time or 0, av.time_base)
+                    for packet in inp.demux():
+                        if packet.dts is None:
+                            continue
+                        index = packet.stream.index
+                        ticks = int(shift / packet.time_base)
+                        packet.pts += ticks
+                        packet.dts += ticks
+                        if index in last_dts and packet.dts <= last_dts[index]:
+                            packet.dts = last_dts[index] + 1
+                            packet.pts = max(packet.pts, packet.dts)
+                        last_dts[index] = packet.dts
+                        packet.stream = out_streams[index]
+                        out.mux(packet)
+                    offset += fractions.Fraction(inp.duration, av.time_base)
+    except Exception as e:
+        logging.warning(f"PyAV could not concatenate the clips ({e}); using ffmpeg instead.")
+        if os.path.exists(final_output):
+            os.remove(final_output)
+        return False
+    logging.info(f"Final video created in-process: {final_output}")
+    return True
+
+def concatenate_processed_videos(processed_videos, final_output):
+    if not processed_videos:
+        logging.warning(f"No processed videos to concatenate; {final_output} was not created.")
+        return False
+    if len(processed_videos) == 1:
+        # A single clip is already the final video; it only needs a stream-copy remux
+        # so the output gets faststart like every other final video.
+        remux_cmd = [FFMPEG, "-y", "-hide_banner", "-nostats", "-loglevel", "error",
+                     "-i", processed_videos[0], "-map", "0", "-c", "copy",
+                     "-movflags", "+faststart", final_output]
         try:
-            subprocess.run(new_cmd, check=True)
+            run_ffmpeg(remux_cmd, "single-clip remux")
             logging.info(f"Final video created: {final_output}")
+            return True
         except subprocess.CalledProcessError as e:
-            logging.error(f"Error during video concatenation: {e}", exc_info=True)
-    else:
-        logging.info("No processed videos, creating an empty final video.")
-        try:
-            w_str, h_str = video_size.split("x")
-            width = int(w_str)
-            height = int(h_str)
-        except Exception:
-            width, height = 640, 480
-        color_filter = f"color=c=black:s={width}x{height}:d=5"
+            logging.warning(f"Remuxing {processed_videos[0]} failed ({e}); concatenating instead.")
+    # Clips rendered by process_video_with_metadata share codec, size, frame
+    # rate and audio layout, so they can usually be joined without re-encoding.
+    # The concat list is fed on stdin, so it needs absolute paths.
+    if streams_are_uniform(processed_videos):
+        if concat_with_pyav(processed_videos, final_output):
+            return True
+        list_text = "".join(
+            "file '" + os.path.abspath(video).replace("'", "'\\''") + "'\n" for video in processed_videos
+        )
+        copy_cmd = [FFMPEG, "-y", "-hide_banner", "-nostats", "-loglevel", "error", "-f", "concat", "-safe", "0",
+                    "-protocol_whitelist", "pipe,file", "-i", "pipe:0", "-c", "copy",
+                    "-movflags", "+faststart", final_output]
         try:
-            subprocess.run(["ffmpeg", "-y", "-loglevel", "error", "-f", "lavfi", "-i", color_filter, final_output], check=True)
-            logging.info(f"Final video created (empty video): {final_output}")
+            run_ffmpeg(copy_cmd, "stream-copy concatenation", input=list_text.encode("utf-8"))
+            logging.info(f"Final video created: {final_output}")
+            return True
         except subprocess.CalledProcessError as e:
-            logging.error(f"Error creating empty video: {e}", exc_info=True)
+            logging.warning(f"Stream-copy concatenation failed ({e}); re-encoding instead.")
+
+    new_cmd = [FFMPEG, "-y", "-hide_banner", "-nostats", "-loglevel", "error"] + VIDEO_ENCODER["input_args"]
+    for video in processed_videos:
+        new_cmd.extend(["-fflags", "+genpts", "-i", video])
+    num_inputs = len(processed_videos)
+    filter_complex_parts = [f"[{i}:v:0]setsar=1[v{i}];" for i in range(num_inputs)]
+    concat_inputs = "".join(f"[v{i}][{i}:a:0]" for i in range(num_inputs))
+    filter_complex_parts.append(concat_filter(concat_inputs, num_inputs))
+    filter_script = write_filter_script("".join(filter_complex_parts))
+    new_cmd.extend([
+        "-filter_complex_threads", str(FILTER_THREADS),
+        "-filter_complex_script", filter_script,
+        "-map", "[v]", "-map", "[a]",
+        *VIDEO_ENCODER["codec_args"],
+        "-colorspace", "bt709", "-color_primaries", "bt709",
+        "-color_trc", "bt709", "-color_range", "tv",
+        "-r", "30",
+        "-c:a", "aac", "-b:a", "192k",
+        "-movflags", "+faststart",
+        final_output
+    ])
+    try:
+        run_ffmpeg(new_cmd, "final concatenation")
+        logging.info(f"Final video created: {final_output}")
+        return True
+    except subprocess.CalledProcessError as e:
+        logging.error(f"Error during video concatenation: {e}", exc_info=True)
+    finally:
+        os.unlink(filter_script)
+    return False
 
 ########################################################################
 # Two-pass processing functions
 ########################################################################
-def extract_video_metadata(video_path, video_size, translate_lang, base_tmp_dir):
-    logging.info(f"Extracting metadata from video: {video_path}")
+def cue_cache_entry(video_path):
+    # Cached cues are keyed by the absolute path and checked against size and mtime.
+    st = os.stat(video_path)
+    key = hashlib.sha1(os.path.abspath(video_path).encode("utf-8")).hexdigest()
+    return os.path.join(CUE_CACHE_DIR, f"{key}.json"), [st.st_size, st.st_mtime_ns]
+
+def load_cached_cues(video_path):
+    try:
+        cache_path, stamp = cue_cache_entry(video_path)
+    except OSError:
+        return None
+    entry = load_json_cache(cache_path)
+    if entry.get("stamp") == stamp:
+        logging.info(f"Using cached subtitles for {video_path}")
+        return entry["cues"]
+    return None
+
+def save_cached_cues(video_path, cues):
+    try:
+        cache_path, stamp = cue_cache_entry(video_path)
+    except OSError:
+        return
+    save_json_cache(cache_path, {"stamp": stamp, "cues": cues})
+
+def extract_video_metadata(video_path, video_size, base_tmp_dir):
+    logging.info("Extracting metadata from video: %s", video_path)
     base_name = os.path.splitext(os.path.basename(video_path))[0]
     safe_base = sanitize_filename(base_name)
     # Create a temporary directory for this video inside the base tmp directory.
     temp_dir = os.path.join(base_tmp_dir, f"video_process_{safe_base}")
     os.makedirs(temp_dir, exist_ok=True)
-    srt_path = os.path.join(temp_dir, f"{safe_base}.srt")
-    try:
-        extract_subtitles(video_path, srt_path)
-    except Exception as e:
-        logging.error(f"Error extracting subtitles from {video_path}: {e}", exc_info=True)
-        shutil.rmtree(temp_dir)
-        return None
-    cues = parse_srt(srt_path)
+    cues = load_cached_cues(video_path)
+    if cues is None:
+        cues = read_subtitle_cues(video_path)
+        if cues is None:
+            try:
+                srt_text = extract_subtitles(video_path)
+            except Exception as e:
+                logging.error(f"Error extracting subtitles from {video_path}: {e}", exc_info=True)
+                shutil.rmtree(temp_dir)
+                return None
+            cues = parse_srt_text(srt_text)
+        # Files without usable subtitles are cached too, so later runs skip them without
+        # opening the file again.
+        save_cached_cues(video_path, cues)
     if not cues:
-        logging.info(f"Video {video_path} does not contain subtitles or cues – skipping.")
+        logging.info("Video %s does not contain subtitles or cues – skipping.", video_path)
         shutil.rmtree(temp_dir)
         return None
     phrase = get_full_phrase_from_cues(cues)
-    # If a single language is provided, compute translation here.
-    if translate_lang:
-        translation = translate_text(phrase, target_language=translate_lang)
-    else:
-        translation = ""
     try:
         w_str, h_str = video_size.split("x")
         width = int(w_str)
         height = int(h_str)
-        logging.info(f"Video size: {width}x{height}")
+        logging.debug("Video size: %dx%d", width, height)
     except Exception as e:
         logging.error(f"Error parsing video_size '{video_size}': {e}. Defaulting to 640x480.", exc_info=True)
         width, height = 640, 480
     return {"video_path": video_path, "temp_dir": temp_dir, "cues": cues, "phrase": phrase,
-            "translation": translation, "width": width, "height": height, "safe_base": safe_base}
+            "translation": "", "translations": {}, "width": width, "height": height, "safe_base": safe_base}
 
-def process_video_with_metadata(data, highlite_phrase, translation_override=None, lang_code=""):
-    logging.info(f"Processing video: {data['video_path']}")
-    # Use the translation_override if provided; otherwise, use the precomputed translation.
-    translation_text = translation_override if translation_override is not None else data["translation"]
+def write_ass_file(data, highlite_phrase, translation_text, lang_code="", events="all"):
     try:
         ass_content = generate_ass_subtitles(cues=data["cues"],
                                              phrase=data["phrase"],
                                              translation=translation_text,
                                              video_width=data["width"],
                                              video_height=data["height"],
-                                             highlite_phrase=highlite_phrase)
+                                             highlite_phrase=highlite_phrase,
+                                             events=events)
     except Exception as e:
         logging.error(f"Error generating ASS for {data['video_path']}: {e}", exc_info=True)
-        shutil.rmtree(data["temp_dir"])
         return None
     # Append the language code (if provided) to temporary filenames to avoid overwrites.
     suffix = f"_{lang_code}" if lang_code else ""
+    if events != "all":
+        suffix += f"_{events}"
     ass_path = os.path.join(data["temp_dir"], f"{data['safe_base']}{suffix}.ass")
     try:
         with open(ass_path, "w", encoding="utf-8") as f:
@@ -625,9 +1215,18 @@ def process_video_with_metadata(data, highlite_phrase, translation_override=None
         logging.info(f"ASS file written: {ass_path}")
     except Exception as e:
         logging.error(f"Error writing ASS file for {data['video_path']}: {e}", exc_info=True)
-        shutil.rmtree(data["temp_dir"])
         return None
+    return ass_path
+
+@functools.lru_cache(maxsize=None)
+def fonts_dir_option(fonts_dir):
+    # The fonts directory is the same for every clip, so it is checked and escaped once.
+    logging.info(f"Using fonts directory for ffmpeg: {fonts_dir}")
+    if os.path.isdir(fonts_dir):
+        return f":fontsdir={escape_path_for_ffmpeg(fonts_dir)}"
+    return ""
 
+def subtitles_filter(ass_path):
     # Use the modified escaping function (now relative)
     ass_path_escaped = escape_path_for_ffmpeg(ass_path)
     if CUSTOM_FONTS_DIR:
@@ -635,50 +1234,292 @@ def process_video_with_metadata(data, highlite_phrase, translation_override=None
     else:
         # Fallback to fonts folder in tmp-dir if not provided
         fonts_dir = os.path.join(os.getcwd(), "tmp-dir", "fonts")
-    if os.path.isdir(fonts_dir):
-        fonts_dir_escaped = escape_path_for_ffmpeg(fonts_dir)
-        fonts_option = f":fontsdir={fonts_dir_escaped}"
-    else:
-        fonts_option = ""
-    logging.info(f"Using fonts directory for ffmpeg: {fonts_dir}")
     logging.info(f"ASS file path (escaped): {ass_path_escaped}")
+    return f"subtitles={ass_path_escaped}{fonts_dir_option(fonts_dir)}"
 
-    ffmpeg_filter = (
+def build_video_filter(data, ass_path):
+    return (
         f"scale={data['width']}:{data['height']}:force_original_aspect_ratio=increase,"
         f"crop={data['width']}:{data['height']},"
-        f"subtitles={ass_path_escaped}{fonts_option}"
+        f"{subtitles_filter(ass_path)}"
     )
-    logging.info(f"FFmpeg filter string: {ffmpeg_filter}")
+
+def process_video_with_metadata(data, highlite_phrase, translation_override=None, lang_code=""):
+    logging.info("Processing video: %s", data["video_path"])
+    # Use the translation_override if provided; otherwise, use the precomputed translation.
+    translation_text = translation_override if translation_override is not None else data["translation"]
+    ass_path = write_ass_file(data, highlite_phrase, translation_text, lang_code)
+    if not ass_path:
+        return None
+
+    ffmpeg_filter = build_video_filter(data, ass_path) + ",setsar=1"
+    if VIDEO_ENCODER["filter"]:
+        ffmpeg_filter += "," + VIDEO_ENCODER["filter"]
+    logging.debug("FFmpeg filter string: %s", ffmpeg_filter)
+    suffix = f"_{lang_code}" if lang_code else ""
     processed_filename = f"processed_{data['safe_base']}{suffix}.mp4"
     output_video = os.path.join(data["temp_dir"], processed_filename)
+    encode_args = [
+        *VIDEO_ENCODER["codec_args"],
+        "-colorspace", "bt709", "-color_primaries", "bt709",
+        "-color_trc", "bt709", "-color_range", "tv",
+        # Fixed frame rate, GOP, timescale and audio layout keep every clip
+        # identical in stream parameters so the concat step can stream-copy.
+        "-r", "30", "-g", "60", "-video_track_timescale", "15360",
+        "-c:a", "aac", "-ar", "48000", "-ac", "2", "-b:a", "192k",
+    ]
     ffmpeg_cmd = [
-        "ffmpeg", "-y", "-loglevel", "error",
+        FFMPEG, "-y", "-hide_banner", "-nostats", "-loglevel", "error",
+        *VIDEO_ENCODER["input_args"],
+        # Decoder threads are capped as well as encoder threads, so PARALLEL_JOBS
+        # clips together use about one thread per core.
+        "-threads", str(FFMPEG_THREADS),
         "-i", data["video_path"],
+        # Exactly one video and one audio stream per clip, so every clip has the same
+        # layout (a source without audio fails here instead of yielding a clip that
+        # cannot be stream-copied together with the others).
+        "-map", "0:v:0", "-map", "0:a:0",
         "-vf", ffmpeg_filter,
-        "-c:v", "libx264", "-preset", "slow", "-crf", "20",
-        "-pix_fmt", "yuv420p",
-        "-colorspace", "bt709", "-color_primaries", "bt709",
-        "-color_trc", "bt709", "-color_range", "tv",
+        *encode_args,
+        "-threads", str(FFMPEG_THREADS),
         output_video
     ]
-    logging.info("Executing FFmpeg command: " + " ".join(ffmpeg_cmd))
     try:
-        subprocess.run(ffmpeg_cmd, check=True)
-        logging.info(f"Video processed successfully: {output_video}")
+        run_ffmpeg(ffmpeg_cmd, "clip")
+        logging.info("Video processed successfully: %s", output_video)
     except subprocess.CalledProcessError as e:
         logging.error(f"Error processing video {data['video_path']} when adding subtitles: {e}", exc_info=True)
-        shutil.rmtree(data["temp_dir"])
+        # temp_dir is shared by all languages of this video, so only this language's
+        # files are removed; other languages may still be rendering from it.
+        for path in (ass_path, output_video):
+            if os.path.exists(path):
+                os.remove(path)
         return None
+    # Record the clip's streams and what they were encoded with, so the concat step
+    # can compare clips without running ffprobe on each of them.
+    save_json_cache(output_video + ".json", {"streams": ["video", "audio"], "size": [data["width"], data["height"]],
+                                             "args": encode_args})
     return output_video
 
+def clip_key(data):
+    # Downloaded folders often contain the same clip twice under different names.
+    # Same file size and same subtitle cues is treated as the same clip.
+    try:
+        size = os.path.getsize(data["video_path"])
+    except OSError:
+        return data["video_path"]
+    cues = tuple((cue["start"], cue["end"], cue["text"]) for cue in data["cues"])
+    return size, cues
+
+def process_videos_parallel(video_data, highlite_phrase, lang=None, lang_code=""):
+    # Every video is an independent ffmpeg subprocess, so a thread pool is enough
+    # to keep PARALLEL_JOBS encoders busy; results keep the input order.
+    def process_one(data):
+        translation_override = data["translations"][lang] if lang else None
+        return process_video_with_metadata(data, highlite_phrase, translation_override=translation_override, lang_code=lang_code)
+
+    # Duplicate clips are rendered once and their processed file is reused.
+    first_by_key = {}
+    keys = []
+    for data in video_data:
+        key = clip_key(data)
+        keys.append(key)
+        if key in first_by_key:
+            logging.info(f"Video {data['video_path']} duplicates {first_by_key[key]['video_path']}; reusing its render.")
+        else:
+            first_by_key[key] = data
+
+    processed_videos = []
+    with concurrent.futures.ThreadPoolExecutor(max_workers=PARALLEL_JOBS) as executor:
+        futures = {key: executor.submit(process_one, data) for key, data in first_by_key.items()}
+        for data, key in zip(video_data, keys):
+            processed_video = futures[key].result()
+            if processed_video:
+                processed_videos.append(processed_video)
+            elif lang_code:
+                logging.error(f"Processing video {data['video_path']} for language {lang_code} ended with an error.")
+            else:
+                logging.error(f"Processing video {data['video_path']} ended with an error.")
+    return processed_videos
+
+########################################################################
+# Single-pass processing: burn subtitles into every clip and concatenate
+# them in one ffmpeg filter graph, so each frame is encoded only once.
+########################################################################
+def render_all_in_one(video_data, highlite_phrase, final_output, lang=None, lang_code=""):
+    inputs = []
+    for data in video_data:
+        translation_text = data["translations"][lang] if lang else data["translation"]
+        ass_path = write_ass_file(data, highlite_phrase, translation_text, lang_code)
+        if ass_path:
+            inputs.append((data, ass_path))
+        else:
+            logging.error(f"Skipping video {data['video_path']}: subtitles could not be prepared.")
+    if not inputs:
+        logging.warning(f"No videos could be prepared; {final_output} was not created.")
+        return False
+
+    cmd = [FFMPEG, "-y", "-hide_banner", "-nostats", "-loglevel", "error"] + VIDEO_ENCODER["input_args"]
+    for data, _ in inputs:
+        cmd.extend(["-i", data["video_path"]])
+    filter_complex_parts = []
+    for i, (data, ass_path) in enumerate(inputs):
+        filter_complex_parts.append(f"[{i}:v:0]{build_video_filter(data, ass_path)},setsar=1[v{i}];")
+    concat_inputs = "".join(f"[v{i}][{i}:a:0]" for i in range(len(inputs)))
+    filter_complex_parts.append(concat_filter(concat_inputs, len(inputs)))
+    filter_script = write_filter_script("".join(filter_complex_parts))
+    cmd.extend([
+        "-filter_complex_threads", str(FILTER_THREADS),
+        "-filter_complex_script", filter_script,
+        "-map", "[v]", "-map", "[a]",
+        *VIDEO_ENCODER["codec_args"],
+        "-colorspace", "bt709", "-color_primaries", "bt709",
+        "-color_trc", "bt709", "-color_range", "tv",
+        "-r", "30",
+        "-c:a", "aac", "-b:a", "192k",
+        "-movflags", "+faststart",
+        final_output
+    ])
+    try:
+        run_ffmpeg(cmd, "single-pass")
+        logging.info(f"Final video created: {final_output}")
+        return len(inputs) == len(video_data)
+    except subprocess.CalledProcessError as e:
+        logging.error(f"Error during single-pass rendering: {e}", exc_info=True)
+        return False
+    finally:
+        os.unlink(filter_script)
+
+def render_languages_in_one(video_data, highlite_phrase, outputs):
+    # Multi-language variant of render_all_in_one: every clip is decoded, scaled
+    # and given its phrase/karaoke subtitles once, then split per language and
+    # only the translation line is burned into each branch. One ffmpeg process
+    # writes all (lang, final_output) pairs in `outputs`.
+    # The phrase size is fitted against the longest translation of each clip, so
+    # all languages share the same base picture.
+    num_outputs = len(outputs)
+    inputs = []
+    for data in video_data:
+        longest_translation = max((data["translations"][lang] for lang, _ in outputs), key=len)
+        base_ass = write_ass_file(data, highlite_phrase, longest_translation, events="base")
+        if not base_ass:
+            logging.error(f"Skipping video {data['video_path']}: subtitles could not be prepared.")
+            continue
+        translation_asses = []
+        for lang, _ in outputs:
+            translation_text = data["translations"][lang]
+            if translation_text.strip():
+                translation_asses.append(write_ass_file(data, highlite_phrase, translation_text,
+                                                        lang_code=lang, events="translation"))
+            else:
+                translation_asses.append(None)
+        inputs.append((data, base_ass, translation_asses))
+    if not inputs:
+        logging.warning("No videos could be prepared; no final videos were created.")
+        return False
+
+    cmd = [FFMPEG, "-y", "-hide_banner", "-nostats", "-loglevel", "error"] + VIDEO_ENCODER["input_args"]
+    for data, _, _ in inputs:
+        cmd.extend(["-i", data["video_path"]])
+    filter_complex_parts = []
+    for i, (data, base_ass, translation_asses) in enumerate(inputs):
+        split_labels = "".join(f"[b{i}_{k}]" for k in range(num_outputs))
+        audio_labels = "".join(f"[a{i}_{k}]" for k in range(num_outputs))
+        filter_complex_parts.append(f"[{i}:v:0]{build_video_filter(data, base_ass)},setsar=1,"
+                                    f"split={num_outputs}{split_labels};")
+        filter_complex_parts.append(f"[{i}:a:0]asplit={num_outputs}{audio_labels};")
+        for k, translation_ass in enumerate(translation_asses):
+            overlay = subtitles_filter(translation_ass) if translation_ass else "null"
+            filter_complex_parts.append(f"[b{i}_{k}]{overlay}[v{i}_{k}];")
+    for k in range(num_outputs):
+        concat_inputs = "".join(f"[v{i}_{k}][a{i}_{k}]" for i in range(len(inputs)))
+        separator = ";" if k < num_outputs - 1 else ""
+        filter_complex_parts.append(concat_filter(concat_inputs, len(inputs), label=f"out{k}") + separator)
+    filter_script = write_filter_script("".join(filter_complex_parts))
+    cmd.extend(["-filter_complex_threads", str(FILTER_THREADS), "-filter_complex_script", filter_script])
+    for k, (_, final_output) in enumerate(outputs):
+        cmd.extend([
+            "-map", f"[vout{k}]", "-map", f"[aout{k}]",
+            *VIDEO_ENCODER["codec_args"],
+            "-colorspace", "bt709", "-color_primaries", "bt709",
+            "-color_trc", "bt709", "-color_range", "tv",
+            "-r", "30",
+            "-c:a", "aac", "-b:a", "192k",
+            "-movflags", "+faststart",
+            final_output
+        ])
+    try:
+        run_ffmpeg(cmd, "multi-language single-pass")
+        for _, final_output in outputs:
+            logging.info(f"Final video created: {final_output}")
+        return len(inputs) == len(video_data)
+    except subprocess.CalledProcessError as e:
+        logging.error(f"Error during multi-language single-pass rendering: {e}", exc_info=True)
+        return False
+    finally:
+        os.unlink(filter_script)
+
+def render_final_video(video_data, highlite_phrase, final_output, two_pass=False, lang=None, lang_code=""):
+    if two_pass:
+        processed_videos = process_videos_parallel(video_data, highlite_phrase, lang=lang, lang_code=lang_code)
+        created = concatenate_processed_videos(processed_videos, final_output)
+        return created and len(processed_videos) == len(video_data)
+    return render_all_in_one(video_data, highlite_phrase, final_output, lang=lang, lang_code=lang_code)
+
+########################################################################
+# Incremental runs: a "<output>.hash" sidecar records what an output was
+# rendered from, so unchanged outputs are skipped on the next run.
+########################################################################
+def output_fingerprint(video_data, highlite_phrase, video_size, lang=None):
+    manifest = {
+        "phrase": highlite_phrase,
+        "video_size": video_size,
+        "lang": lang,
+        "fonts": [PHRASE_FONT, PHRASE_FONT_SIZE, TRANSLATION_FONT, TRANSLATION_FONT_SIZE,
+                  WEBSITE_FONT, WEBSITE_FONT_SIZE],
+        "encoder": VIDEO_ENCODER["codec_args"],
+        "script": os.stat(os.path.realpath(__file__)).st_mtime_ns,
+        "videos": [],
+    }
+    for data in video_data:
+        st = os.stat(data["video_path"])
+        manifest["videos"].append([data["video_path"], st.st_size, st.st_mtime_ns, data["translations"]])
+    return hashlib.sha1(json.dumps(manifest, sort_keys=True).encode("utf-8")).hexdigest()
+
+def output_is_current(final_output, fingerprint):
+    try:
+        with open(final_output + ".hash", encoding="utf-8") as f:
+            return f.read().strip() == fingerprint and os.path.exists(final_output)
+    except OSError:
+        return False
+
+def mark_output_current(final_output, fingerprint):
+    try:
+        with open(final_output + ".hash", "w", encoding="utf-8") as f:
+            f.write(fingerprint)
+    except OSError as e:
+        logging.warning(f"Could not write {final_output}.hash: {e}")
+
+def safe_rmtree(path):
+    try:
+        shutil.rmtree(path)
+        return True
+    except Exception as e:
+        logging.error("Error removing temporary directory %s: %s", path, e, exc_info=True)
+        return False
+
 ########################################################################
 # Main function
 ########################################################################
 def main():
     global PHRASE_FONT, TRANSLATION_FONT, WEBSITE_FONT, CUSTOM_FONTS_DIR
     global PHRASE_FONT_SIZE, TRANSLATION_FONT_SIZE, WEBSITE_FONT_SIZE, GOOGLE_API_KEY
+    global FFMPEG_THREADS, PARALLEL_JOBS, VIDEO_ENCODER, DUMP_COMMANDS, FFMPEG_SLOTS
 
     args = parse_args()
+    if args.verbose:
+        logging.getLogger().setLevel(logging.DEBUG)
+    check_ffmpeg_installed()
 
     # Change working directory to the video folder so all paths are relative.
     video_folder = os.path.abspath(args.video_folder)
@@ -691,20 +1532,16 @@ def main():
     logging.info(f"Temporary files will be stored in: {base_tmp_dir}")
 
     # Copy the fonts folder (if it exists) from the script directory into tmp-dir.
-    script_dir = os.path.dirname(os.path.realpath(__file__))
-    src_fonts_dir = os.path.join(script_dir, "fonts")
+    src_fonts_dir = DEFAULT_FONTS_DIR
     if os.path.isdir(src_fonts_dir):
         dest_fonts_dir = os.path.join(base_tmp_dir, "fonts")
         if os.path.exists(dest_fonts_dir):
             shutil.rmtree(dest_fonts_dir)
-        shutil.copytree(src_fonts_dir, dest_fonts_dir)
+        shutil.copytree(src_fonts_dir, dest_fonts_dir, copy_function=link_or_copy)
         logging.info(f"Copied fonts folder from {src_fonts_dir} to {dest_fonts_dir}")
         if CUSTOM_FONTS_DIR is None:
             CUSTOM_FONTS_DIR = dest_fonts_dir
 
-    # Clean any leftover concat helper files from previous runs.
-    remove_working_temp_files(base_tmp_dir)
-
     # If --font_size is provided, update the font sizes accordingly.
     if args.font_size is not None:
         PHRASE_FONT_SIZE = args.font_size
@@ -729,6 +1566,21 @@ def main():
 
     GOOGLE_API_KEY = args.google_api_key
 
+    FFMPEG_THREADS = max(1, args.threadcount)
+    DUMP_COMMANDS = args.dump_cmd
+    if args.parallel is not None:
+        PARALLEL_JOBS = max(1, args.parallel)
+    else:
+        PARALLEL_JOBS = max(1, (os.cpu_count() or 1) // FFMPEG_THREADS)
+    FFMPEG_SLOTS = threading.BoundedSemaphore(PARALLEL_JOBS)
+    logging.info(f"Processing up to {PARALLEL_JOBS} video(s) in parallel with {FFMPEG_THREADS} ffmpeg thread(s) each.")
+
+    if args.encoder:
+        VIDEO_ENCODER = encoder_from_name(args.encoder)
+    else:
+        VIDEO_ENCODER = VIDEO_ENCODERS[detect_video_encoder(args.hwaccel)]
+    logging.info(f"Using video encoder: {VIDEO_ENCODER['codec_args'][1]}")
+
     video_files = get_video_files(os.getcwd())
     total_videos = len(video_files)
     if not video_files:
@@ -742,22 +1594,31 @@ def main():
     else:
         languages = []
     
+    # Subtitle extraction is I/O bound and runs in ffmpeg subprocesses,
+    # so all videos can be handled concurrently from a thread pool.
     video_data = []
-    # In multiple-language mode, pass None so that translation is computed later.
-    for video in video_files:
-        if languages and len(languages) == 1:
-            data = extract_video_metadata(video, args.video_size, languages[0], base_tmp_dir)
-        else:
-            data = extract_video_metadata(video, args.video_size, None, base_tmp_dir)
-        if data:
-            video_data.append(data)
-        else:
-            logging.error(f"Metadata extraction failed for {video}.")
+    # Cached cues are read without spawning anything, so the pool is wider than
+    # --parallel; the ffmpeg extractions themselves still wait for FFMPEG_SLOTS.
+    with concurrent.futures.ThreadPoolExecutor(max_workers=min(16, (os.cpu_count() or 1) * 2)) as executor:
+        metas = executor.map(lambda video: extract_video_metadata(video, args.video_size, base_tmp_dir), video_files)
+        for video, data in zip(video_files, metas):
+            if data:
+                video_data.append(data)
+            else:
+                logging.error(f"Metadata extraction failed for {video}.")
     if not video_data:
         logging.info("No videos with valid subtitles found; exiting.")
         return
 
     phrases = [d['phrase'] for d in video_data]
+    # Translate all phrases up-front with one batched request per language;
+    # the languages are requested concurrently over the pooled session.
+    if languages:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=min(8, len(languages))) as executor:
+            results = executor.map(lambda lang: translate_texts(phrases, target_language=lang), languages)
+            for lang, translations in zip(languages, results):
+                for data, translation in zip(video_data, translations):
+                    data["translations"][lang] = translation
     if args.highlite_phrase.strip():
         chosen_phrase = args.highlite_phrase.lower()
         logging.info(f"Using provided highlite_phrase: '{chosen_phrase}'")
@@ -769,83 +1630,61 @@ def main():
             logging.info("No common contiguous sequence found; falling back to first non-empty video phrase.")
         chosen_phrase = computed if computed.strip() else next((p for p in phrases if p.strip()), "output").lower()
 
+    if args.output_dir:
+        output_dir = args.output_dir
+    else:
+        output_dir = os.path.join(os.getcwd(), "result")
+    os.makedirs(output_dir, exist_ok=True)
+    base_filename = create_filename_from_phrase(chosen_phrase, args.video_size)
+
     if languages:
-        # If exactly one language is provided, process in single-language mode.
-        if len(languages) == 1:
-            processed_videos = []
-            temp_dirs = []
-            for data in video_data:
-                processed_video = process_video_with_metadata(data, chosen_phrase)
-                if processed_video:
-                    processed_videos.append(processed_video)
-                    temp_dirs.append(data["temp_dir"])
-                else:
-                    logging.error(f"Processing video {data['video_path']} ended with an error.")
-            if args.output_dir:
-                output_dir = args.output_dir
-            else:
-                output_dir = os.path.join(os.getcwd(), "result")
-            os.makedirs(output_dir, exist_ok=True)
-            base_filename = create_filename_from_phrase(chosen_phrase, args.video_size)
-            base_filename = f"{languages[0]}-{base_filename}"
-            final_output = os.path.join(output_dir, base_filename + ".mp4")
-            concatenate_processed_videos(processed_videos, final_output, base_tmp_dir, args.video_size)
-        else:
-            # Multiple language mode: generate a final video for each language.
-            if args.output_dir:
-                output_dir = args.output_dir
-            else:
-                output_dir = os.path.join(os.getcwd(), "result")
-            os.makedirs(output_dir, exist_ok=True)
-            for lang in languages:
-                logging.info(f"Processing final video for language: {lang}")
-                processed_videos_lang = []
-                for data in video_data:
-                    # Compute translation for each video for the current language.
-                    translation_override = translate_text(data["phrase"], target_language=lang)
-                    processed_video = process_video_with_metadata(data, chosen_phrase, translation_override=translation_override, lang_code=lang)
-                    if processed_video:
-                        processed_videos_lang.append(processed_video)
-                    else:
-                        logging.error(f"Processing video {data['video_path']} for language {lang} ended with an error.")
-                base_filename = create_filename_from_phrase(chosen_phrase, args.video_size)
-                base_filename = f"{lang}-{base_filename}"
-                final_output = os.path.join(output_dir, base_filename + ".mp4")
-                concatenate_processed_videos(processed_videos_lang, final_output, base_tmp_dir, args.video_size)
+        outputs = [(lang, os.path.join(output_dir, f"{lang}-{base_filename}.mp4")) for lang in languages]
     else:
         # No translation provided: process videos without translation overlay.
-        processed_videos = []
-        temp_dirs = []
-        for data in video_data:
-            processed_video = process_video_with_metadata(data, chosen_phrase)
-            if processed_video:
-                processed_videos.append(processed_video)
-                temp_dirs.append(data["temp_dir"])
+        outputs = [(None, os.path.join(output_dir, base_filename + ".mp4"))]
+
+    # Outputs whose sidecar hash still matches their inputs are not rendered again.
+    fingerprints = {final_output: output_fingerprint(video_data, chosen_phrase, args.video_size, lang)
+                    for lang, final_output in outputs}
+    if not args.force:
+        pending = []
+        for lang, final_output in outputs:
+            if output_is_current(final_output, fingerprints[final_output]):
+                logging.info(f"Output is up to date, skipping (use --force to rebuild): {final_output}")
             else:
-                logging.error(f"Processing video {data['video_path']} ended with an error.")
-        if args.output_dir:
-            output_dir = args.output_dir
-        else:
-            output_dir = os.path.join(os.getcwd(), "result")
-        os.makedirs(output_dir, exist_ok=True)
-        base_filename = create_filename_from_phrase(chosen_phrase, args.video_size)
-        final_output = os.path.join(output_dir, base_filename + ".mp4")
-        concatenate_processed_videos(processed_videos, final_output, base_tmp_dir, args.video_size)
+                pending.append((lang, final_output))
+        outputs = pending
+
+    if len(outputs) > 1 and not args.two_pass:
+        # The shared part of every language's picture is rendered only once.
+        logging.info(f"Processing final videos for languages: {', '.join(lang for lang, _ in outputs)}")
+        if render_languages_in_one(video_data, chosen_phrase, outputs):
+            for _, final_output in outputs:
+                mark_output_current(final_output, fingerprints[final_output])
+    elif outputs:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=min(LANGUAGE_JOBS, len(outputs))) as executor:
+            futures = []
+            for lang, final_output in outputs:
+                if lang:
+                    logging.info(f"Processing final video for language: {lang}")
+                futures.append((final_output, executor.submit(render_final_video, video_data, chosen_phrase, final_output,
+                                                              two_pass=args.two_pass, lang=lang, lang_code=lang or "")))
+            for final_output, future in futures:
+                if future.result():
+                    mark_output_current(final_output, fingerprints[final_output])
 
     # Remove temporary directories unless --create_tmp is specified.
-    for data in video_data:
-        try:
-            shutil.rmtree(data["temp_dir"])
-            logging.info(f"Temporary directory removed: {data['temp_dir']}")
-        except Exception as e:
-            logging.error(f"Error removing temporary directory {data['temp_dir']}: {e}", exc_info=True)
-    if not args.create_tmp:
-        remove_working_temp_files(base_tmp_dir)
-        try:
-            shutil.rmtree(base_tmp_dir)
+    # The commands written by --dump-cmd read the ASS files and clips in tmp-dir,
+    # so nothing is removed then.
+    if args.dump_cmd:
+        logging.info(f"Keeping {base_tmp_dir} for the commands written by --dump-cmd.")
+    else:
+        # Deletion is syscall bound, so the directories are removed side by side.
+        with concurrent.futures.ThreadPoolExecutor(max_workers=min(8, len(video_data))) as executor:
+            removed = sum(executor.map(safe_rmtree, (data["temp_dir"] for data in video_data)))
+        logging.info("Removed %d of %d temporary directories.", removed, len(video_data))
+        if not args.create_tmp and safe_rmtree(base_tmp_dir):
             logging.info(f"Deleted base temporary directory: {base_tmp_dir}")
-        except Exception as e:
-            logging.error(f"Error deleting temporary directory {base_tmp_dir}: {e}", exc_info=True)
 
     logging.info("\nExecution log:")
     logging.info(f"Total videos: {total_videos}")
@@ -853,4 +1692,7 @@ def main():
     logging.info("Processing completed.")
 
 if __name__ == "__main__":
+    # Automatic installation of dependencies (only on first start, when requirements.txt
+    # changes, or when --install_deps is given)
+    install_dependencies(force="--install_deps" in sys.argv)
     main()